@@ -1,20 +1,47 @@
 import logging
+import re
+import struct
 from dataclasses import dataclass, field
 from enum import Enum
-from typing import Optional, Dict, List, Tuple
+from typing import Optional, Dict, Iterable, Iterator, List, Sequence, Tuple, Union, overload
 
 
 # ported over from
 # https://golang.org/src/debug/gosym/pclntab.go
 
 
+__all__ = [
+    "SYMS_ENCODING",
+    "Sym", "Func", "Obj",
+    "ByteOrder",
+    "Go12State", "FuncTab",
+    "OLD_QUANTUM", "GO12_MAGIC",
+    "LineTable", "new_line_table",
+]
+
+
 SYMS_ENCODING = "utf-8"
 
 
 logger = logging.getLogger(__name__)
 
 
-@dataclass
+_NUL = re.compile(b"\x00")
+
+
+def _find_nul(data: memoryview, off: int = 0) -> int:
+    """Returns the offset of the first NUL byte of data at or after off, or -1.
+
+    Unlike bytes.find, this works on any buffer (memoryview, mmap, ...)
+    without copying it, while still scanning at C speed.
+    """
+    m = _NUL.search(data, off)
+    if m is None:
+        return -1
+    return m.start()
+
+
+@dataclass(slots=True)
 class Sym:
     value: int = 0
     type: int = 0
@@ -23,7 +50,7 @@ class Sym:
     func: Optional["Func"] = field(default=None, repr=False)
 
 
-@dataclass
+@dataclass(slots=True)
 class Func(Sym):
     sym: Sym = field(default_factory=Sym)
     entry: int = 0
@@ -35,7 +62,7 @@ class Func(Sym):
     obj: Optional["Obj"] = None
 
 
-@dataclass
+@dataclass(slots=True)
 class Obj:
     funcs: List[Func] = field(default_factory=list, repr=False)
     paths: Optional[List[Sym]] = None
@@ -57,9 +84,14 @@ class ByteOrder(Enum):
     def to_bytes(self, i: int, length: int) -> bytes:
         return i.to_bytes(length, self.value)
 
+    def struct(self, fmt: str) -> struct.Struct:
+        prefix = "<" if self is ByteOrder.LITTLE_ENDIAN else ">"
+        return struct.Struct(prefix + fmt)
 
-@dataclass
+
+@dataclass(slots=True)
 class Go12State:
+    data: memoryview
     functab: memoryview
     filetab: memoryview
 
@@ -74,6 +106,23 @@ class Go12State:
     file_map: Dict[str, int] = field(default_factory=dict)
     strings: Dict[int, str] = field(default_factory=dict)
 
+    # readers specialized for the byte order and pointer size of the table
+    _func_info: struct.Struct = field(init=False, repr=False, compare=False)
+    _functab: struct.Struct = field(init=False, repr=False, compare=False)
+    _func_entry: struct.Struct = field(init=False, repr=False, compare=False)
+
+    def __post_init__(self) -> None:
+        # Function info records start with the entry, followed by the name
+        # offset, the size of the arguments and the size of the frame.
+        self._func_info = self.binary.struct(f"{self.ptrsize}xI4xI")
+        # The function table is a sequence of (entry, info offset) pairs,
+        # followed by the end address of the last function.
+        word = "Q" if self.ptrsize == 8 else "I"
+        n = len(self.functab) // self.ptrsize // 2 if self.ptrsize else 0
+        self._functab = self.binary.struct(f"{2 * n + 1}{word}")
+        # entry and info offset of a function, and the entry of the next one
+        self._func_entry = self.binary.struct(3 * word)
+
     def uintptr(self, b: memoryview) -> int:
         return self.binary.from_bytes(b[:self.ptrsize])
 
@@ -82,26 +131,26 @@ class Go12State:
         if res is not None:
             return res
 
-        # strlen
-        size = 0
-        for b in data[off:]:
-            if b == 0:
-                break
-            size += 1
+        end = _find_nul(data, off)
+        if end < 0:
+            end = len(data)
 
-        res = data[off:off + size].tobytes().decode(SYMS_ENCODING)
+        res = data[off:end].tobytes().decode(SYMS_ENCODING)
 
         self.strings[off] = res
         return res
 
     # initFileMap initializes the map from file name to file number.
     def init_file_map(self) -> None:
-        if self.file_map is not None:
+        if self.file_map:
             return
 
+        # The file table starts with its own size, followed by the offsets
+        # of the file names: read them all at once.
+        offsets = self.binary.struct(f"{self.nfiletab}I").unpack_from(self.filetab)
         self.file_map = {
-            self.string(self.binary.u32(self.filetab[4 * i:])): i
-            for i in range(1, self.nfiletab)
+            self.string(self.data, off): i
+            for i, off in enumerate(offsets[1:], start=1)
         }
 
     # go12MapFiles adds to m a key for every file in the Go 1.2 LineTable.
@@ -112,28 +161,74 @@ class Go12State:
         for file_name in self.file_map.keys():
             m[file_name] = obj
 
-    def go12_funcs(self, line_table: "LineTable") -> List[Func]:
+    def go12_func(self, line_table: "LineTable", entry: int, info_off: int, end: int) -> Func:
         data = line_table.data
-        n = len(self.functab) // self.ptrsize // 2
-        funcs = []
+        name_off, frame_size = self._func_info.unpack_from(data, info_off)
+        # most names are already cached when the table is walked again
+        name = self.strings.get(name_off)
+        if name is None:
+            name = self.string(data, name_off)
+        return Func(
+            sym=Sym(
+                value=entry,
+                type=ord("T"),
+                name=name,
+                go_type=0,
+            ),
+            entry=entry,
+            end=end,
+            line_table=line_table,
+            frame_size=frame_size,
+        )
+
+    def func_tab(self, line_table: "LineTable") -> "FuncTab":
+        return FuncTab(self, line_table)
+
+    def go12_funcs(self, line_table: "LineTable") -> List[Func]:
+        return list(self.func_tab(line_table))
+
+
+class FuncTab(Sequence[Func]):
+    """The functions of a Go 1.2 line table, only decoded when accessed.
+
+    The table itself stores nothing but the raw function table: each
+    access builds a new Func.
+    """
+
+    __slots__ = ("go12", "line_table", "_len")
+
+    def __init__(self, go12: Go12State, line_table: "LineTable") -> None:
+        self.go12 = go12
+        self.line_table = line_table
+        self._len = len(go12.functab) // go12.ptrsize // 2
+
+    def __len__(self) -> int:
+        return self._len
+
+    @overload
+    def __getitem__(self, i: int) -> Func: ...
+
+    @overload
+    def __getitem__(self, i: slice) -> List[Func]: ...
+
+    def __getitem__(self, i: Union[int, slice]) -> Union[Func, List[Func]]:
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(self._len))]
+        if i < 0:
+            i += self._len
+        if not 0 <= i < self._len:
+            raise IndexError("function index out of range")
+        go12 = self.go12
+        entry, info_off, end = go12._func_entry.unpack_from(go12.functab, 2 * i * go12.ptrsize)
+        return go12.go12_func(self.line_table, entry, info_off, end)
+
+    def __iter__(self) -> Iterator[Func]:
+        # decode the whole function table at once
+        go12, line_table, n = self.go12, self.line_table, self._len
+        words = go12._functab.unpack_from(go12.functab)
         for i in range(n):
-            entry = self.uintptr(self.functab[2 * i * self.ptrsize:])
-            end = self.uintptr(self.functab[(2 * i + 2) * self.ptrsize:])
-            info = data[self.uintptr(self.functab[(2 * i + 1) * self.ptrsize:]):]
-            frame_size = self.binary.u32(info[self.ptrsize + 2 * 4:])
-            funcs.append(Func(
-                sym=Sym(
-                    value=entry,
-                    type=ord("T"),
-                    name=self.string(data, self.binary.u32(info[self.ptrsize:])),
-                    go_type=0,
-                ),
-                entry=entry,
-                end=end,
-                line_table=line_table,
-                frame_size=frame_size,
-            ))
-        return funcs
+            entry, info_off, end = words[2 * i:2 * i + 3]
+            yield go12.go12_func(line_table, entry, info_off, end)
 
 
 # NOTE(rsc): This is wrong for GOARCH=arm, which uses a quantum of 4,
@@ -145,8 +240,10 @@ OLD_QUANTUM = 1
 
 GO12_MAGIC = 0xfffffffb
 
+_U32_BE = struct.Struct(">I")
 
-@dataclass
+
+@dataclass(slots=True)
 class LineTable:
     data: memoryview
     PC: int = 0
@@ -191,6 +288,8 @@ class LineTable:
             filetab = filetab[:nfiletab * 4]
 
             self._go12 = Go12State(
+                data=self.data,
+                binary=binary,
                 quantum=quantum,
                 ptrsize=ptrsize,
                 nfunctab=nfunctab,
@@ -206,36 +305,64 @@ class LineTable:
         data, pc, line = self.parse(pc, -1)
         return LineTable(data=data, PC=pc, line=line)
 
+    def func_tab(self) -> FuncTab:
+        go12 = self.go12
+        if go12 is None:
+            raise ValueError("not a Go 1.2 line table")
+        return go12.func_tab(self)
+
+    def slices(self, pcs: Iterable[int]) -> List["LineTable"]:
+        """Slices the table at each of the given pcs, in order.
+
+        This is equivalent to chaining calls to slice, but only walks the
+        table once and does not create intermediate tables.
+        """
+        res = []
+        data, pos, pc, line = self.data, 0, self.PC, self.line
+        for target_pc in pcs:
+            pos, pc, line = _parse_line_table(data, pos, pc, line, target_pc, -1)
+            res.append(LineTable(data=data[pos:], PC=pc, line=line))
+        return res
+
     def parse(self, target_pc: int, target_line: int) -> Tuple[memoryview, int, int]:
-        # The PC/line table can be thought of as a sequence of
-        #  <pc update>* <line update>
-        # batches. Each update batch results in a (pc, line) pair,
-        # where line applies to every PC from pc up to but not
-        # including the pc of the next pair.
-
-        # Here we process each update individually, which simplifies
-        # the code, but makes the corner cases more confusing.
-        b, pc, line = self.data, self.PC, self.line
-        while pc <= target_pc and line != target_line and len(b) > 0:
-            code = b[0]
-            b = b[1:]
-            if code == 0:
-                if len(b) < 4:
-                    b = b[0:0]
-                else:
-                    val = int.from_bytes(b[:4], "big")
-                    b = b[4:]
-                    line += val
-            elif code <= 64:
-                line += code
-            elif code <= 128:
-                line -= code - 64
+        pos, pc, line = _parse_line_table(self.data, 0, self.PC, self.line, target_pc, target_line)
+        return self.data[pos:], pc, line
+
+
+def _parse_line_table(b: memoryview, pos: int, pc: int, line: int,
+                     target_pc: int, target_line: int) -> Tuple[int, int, int]:
+    # The PC/line table can be thought of as a sequence of
+    #  <pc update>* <line update>
+    # batches. Each update batch results in a (pc, line) pair,
+    # where line applies to every PC from pc up to but not
+    # including the pc of the next pair.
+
+    # Here we process each update individually, which simplifies
+    # the code, but makes the corner cases more confusing.
+
+    # This loop is the hot path of pre-Go 1.2 line tables: it only touches
+    # integers and locals, and returns the position where it stopped.
+    size = len(b)
+    u32_be = _U32_BE.unpack_from
+    while pc <= target_pc and line != target_line and pos < size:
+        code = b[pos]
+        pos += 1
+        if code == 0:
+            if size - pos < 4:
+                pos = size
             else:
-                pc += OLD_QUANTUM * (code - 128)
-                continue
-            pc += OLD_QUANTUM
-        return b, pc, line
-
-
-def new_line_table(data: bytes, text: int) -> LineTable:
+                line += u32_be(b, pos)[0]
+                pos += 4
+        elif code <= 64:
+            line += code
+        elif code <= 128:
+            line -= code - 64
+        else:
+            pc += OLD_QUANTUM * (code - 128)
+            continue
+        pc += OLD_QUANTUM
+    return pos, pc, line
+
+
+def new_line_table(data: Union[bytes, memoryview], text: int) -> LineTable:
     return LineTable(data=memoryview(data), PC=text, line=0)
@@ -1,12 +1,22 @@
 import logging
+import re
+import struct
 from dataclasses import dataclass, field
-from typing import Optional, List, Dict, Iterator
+from typing import Optional, List, Dict, Iterator, Tuple, Union
 from .pclntab import LineTable, ByteOrder, Sym, Obj, Func, SYMS_ENCODING
 
 
 # https://golang.org/src/debug/gosym/symtab.go
 
 
+__all__ = [
+    "DecodingError",
+    "Table",
+    "LITTLE_ENDIAN_SYMTAB", "BIG_ENDIAN_SYMTAB", "OLD_LITTLE_ENDIAN_SYMTAB",
+    "walksymtab", "new_table",
+]
+
+
 logger = logging.getLogger(__name__)
 
 
@@ -14,7 +24,7 @@ class DecodingError(Exception):
     pass
 
 
-@dataclass
+@dataclass(slots=True)
 class Table:
     syms: List[Sym] = field(default_factory=list)
     funcs: List[Func] = field(default_factory=list)
@@ -24,243 +34,287 @@ class Table:
     go12line: Optional[LineTable] = None
 
 
-@dataclass
-class sym:
-    value: int = 0
-    typ: int = 0
-    name: bytes = b""
-    gotype: int = 0
-
-
 LITTLE_ENDIAN_SYMTAB     = bytes((0xFD, 0xFF, 0xFF, 0xFF, 0x00, 0x00, 0x00))
 BIG_ENDIAN_SYMTAB        = bytes((0xFF, 0xFF, 0xFF, 0xFD, 0x00, 0x00, 0x00))
 OLD_LITTLE_ENDIAN_SYMTAB = bytes((0xFE, 0xFF, 0xFF, 0xFF, 0x00, 0x00))
 
+# symbol types
+_TEXT_SYMS = frozenset(b"TtLl")
+_PATH_SYMS = frozenset(b"Zz")
+_FILE_NAME_SYM = ord("f")
+_FRAME_SIZE_SYM = ord("m")
+_PARAM_SYM = ord("p")
+_LOCAL_SYM = ord("a")
+
+# new format symbol types are encoded as an index into A-Za-z
+_NEW_SYMTAB_TYPES = bytes(range(ord("A"), ord("Z") + 1)) + bytes(range(ord("a"), ord("a") + 38))
+
+_NUL = re.compile(b"\x00")
+
+# path symbol names are sequences of 2-byte elements, terminated by a
+# double NUL. this matches all the elements up to the terminator.
+_PATH_ELEMENTS = re.compile(rb"(?:[^\x00].|.[^\x00])*", re.DOTALL)
+
+
+# symbols decoded by walksymtab: (type, value, raw name, go type)
+_RawSym = Tuple[int, int, bytes, int]
+
 
-def walksymtab(data: memoryview) -> Iterator[sym]:
+def walksymtab(data: Union[bytes, memoryview]) -> Iterator[_RawSym]:
+    data = memoryview(data)
     if len(data) == 0:
-        return
+        return iter(())
 
     new_table_format = False
     order = ByteOrder.BIG_ENDIAN
-    data_magic = data[:7].tobytes()  # for .startswith
-    if data_magic.startswith(OLD_LITTLE_ENDIAN_SYMTAB):
+    # memoryviews compare bytewise with bytes, without copying
+    if data[:len(OLD_LITTLE_ENDIAN_SYMTAB)] == OLD_LITTLE_ENDIAN_SYMTAB:
         data = data[6:]
         order = ByteOrder.LITTLE_ENDIAN
-    elif data_magic.startswith(BIG_ENDIAN_SYMTAB):
+    elif data[:len(BIG_ENDIAN_SYMTAB)] == BIG_ENDIAN_SYMTAB:
         new_table_format = True
-    elif data_magic.startswith(LITTLE_ENDIAN_SYMTAB):
+    elif data[:len(LITTLE_ENDIAN_SYMTAB)] == LITTLE_ENDIAN_SYMTAB:
         new_table_format = True
         order = ByteOrder.LITTLE_ENDIAN
 
-    ptrsz = 0
-    if new_table_format:
-        if len(data) < 8:
-            raise DecodingError("unexpected EOF")
-        ptrsz = data[7]
-        if ptrsz not in (4, 8):
-            return DecodingError("invalid pointer size")
-        data = data[8:]
-
-    s = sym()
-    p = data
-    while len(p) >= 4:
-        typ: int
-        if new_table_format:
-            # Symbol type, value, Go type.
-            typ = p[0] & 0x3F
-            wide_value = (p[0] & 0x40) != 0
-            go_type = (p[0] & 0x80) != 0
-            if typ < 26:
-                typ += ord("A")
-            else:
-                typ += ord("a") - 26
-            s.typ = typ
-            p = p[1:]
+    if not new_table_format:
+        return _walk_old_symtab(data, order)
+
+    if len(data) < 8:
+        raise DecodingError("unexpected EOF")
+    ptrsz = data[7]
+    if ptrsz not in (4, 8):
+        raise DecodingError("invalid pointer size")
+    return _walk_new_symtab(data[8:], order, ptrsz)
+
+
+# Each symbol table format gets its own decoding loop, so that the
+# per-symbol work does not branch on the format, and everything the loop
+# needs is bound to locals.
+
+
+def _walk_new_symtab(p: memoryview, order: ByteOrder, ptrsz: int) -> Iterator[_RawSym]:
+    uintptr = order.struct("Q" if ptrsz == 8 else "I").unpack_from
+    sym_types = _NEW_SYMTAB_TYPES
+    nul_search = _NUL.search
+    path_syms = _PATH_SYMS
+    path_elements = _PATH_ELEMENTS.match
+    pos = 0
+    size = len(p)
+    while size - pos >= 4:
+        # Symbol type, value, Go type.
+        flags = p[pos]
+        typ = sym_types[flags & 0x3F]
+        pos += 1
+
+        if flags & 0x40:
+            # wide value
+            if size - pos < ptrsz:
+                raise DecodingError("unexpected EOF")
+            value = uintptr(p, pos)[0]
+            pos += ptrsz
+        else:
+            value = 0
+            shift = 0
+            while pos < size and p[pos] & 0x80 != 0:
+                value |= (p[pos] & 0x7F) << shift
+                shift += 7
+                pos += 1
+            if pos == size:
+                raise DecodingError("unexpected EOF")
 
-            if wide_value:
-                if len(p) < ptrsz:
-                    raise DecodingError("unexpected EOF")
+            value |= p[pos] << shift
+            pos += 1
 
-                s.value = order.from_bytes(p[0:ptrsz])
-                p = p[ptrsz:]
-            else:
-                s.value = 0
-                shift = 0
-                while len(p) > 0 and p[0] & 0x80 != 0:
-                    s.value |= p[0] & 0x7F << shift
-                    shift += 7
-                    p = p[1:]
-                if len(p) == 0:
-                    return DecodingError("unexpected EOF")
-
-                s.value |= p[0] << shift
-                p = p[1:]
-            if go_type:
-                if len(p) < ptrsz:
-                    raise DecodingError("unexpected EOF")
-                # fixed-width go type
-                s.gotype = order.from_bytes(p[0:ptrsz])
-                p = p[ptrsz:]
-        else:
-            # value, symbol type
-            s.value = order.from_bytes(p[0:4])
-            if len(p) < 5:
+        gotype = 0
+        if flags & 0x80:
+            if size - pos < ptrsz:
                 raise DecodingError("unexpected EOF")
-            typ = p[4]
-            if typ & 0x80 == 0:
-                raise DecodingError("bad symbol type")
-            typ = typ & ~0x80
-            s.typ = typ
-            p = p[5:]
+            # fixed-width go type
+            gotype = uintptr(p, pos)[0]
+            pos += ptrsz
 
         # Name.
-        i: int
-        nnul: int
-        for i in range(len(p)):
-            if p[i] == 0:
-                nnul = 1
-                break
-
-        if typ in b"Zz":
-            p = p[i+nnul:]
-            for i in range(0, len(p), 2):
-                if p[i] == 0 and p[i + 1] == 0:
-                    nnul = 2
-                    break
-
-        if len(p) < i + nnul:
+        start = pos
+        m = nul_search(p, pos)
+        end = size if m is None else m.start()
+        # an unterminated name runs to the end of the table
+        nnul = 0 if m is None else 1
+
+        if typ in path_syms:
+            start = end + nnul
+            end = path_elements(p, start).end()
+            # the elements only stop before the end on a double NUL
+            if size - end >= 2:
+                nnul = 2
+
+        if size < end + nnul:
             raise DecodingError("unexpected EOF")
-        s.name = p[0:i].tobytes()
-        i += nnul
-        p = p[i:]
+        pos = end + nnul
 
-        if not new_table_format:
-            if len(p) < 4:
-                raise DecodingError("unexpected EOF")
-            s.gotype = order.from_bytes(p[:4])
-            p = p[4:]
+        yield typ, value, p[start:end].tobytes(), gotype
 
-        yield s
 
+def _walk_old_symtab(p: memoryview, order: ByteOrder) -> Iterator[_RawSym]:
+    u32 = order.struct("I").unpack_from
+    nul_search = _NUL.search
+    path_syms = _PATH_SYMS
+    path_elements = _PATH_ELEMENTS.match
+    pos = 0
+    size = len(p)
+    while size - pos >= 4:
+        # value, symbol type
+        if size - pos < 5:
+            raise DecodingError("unexpected EOF")
+        value = u32(p, pos)[0]
+        typ = p[pos + 4]
+        if typ & 0x80 == 0:
+            raise DecodingError("bad symbol type")
+        typ = typ & ~0x80
+        pos += 5
 
-def new_table(symtab: memoryview, pcln: LineTable) -> Optional[Table]:
+        # Name.
+        start = pos
+        m = nul_search(p, pos)
+        end = size if m is None else m.start()
+        # an unterminated name runs to the end of the table
+        nnul = 0 if m is None else 1
+
+        if typ in path_syms:
+            start = end + nnul
+            end = path_elements(p, start).end()
+            # the elements only stop before the end on a double NUL
+            if size - end >= 2:
+                nnul = 2
+
+        if size < end + nnul:
+            raise DecodingError("unexpected EOF")
+        pos = end + nnul
+
+        # Go type.
+        if size - pos < 4:
+            raise DecodingError("unexpected EOF")
+        gotype = u32(p, pos)[0]
+        pos += 4
+
+        yield typ, value, p[start:end].tobytes(), gotype
+
+
+def new_table(symtab: Union[bytes, memoryview], pcln: LineTable) -> Optional[Table]:
     t = Table()
     if pcln.go12 is not None:
         go12 = pcln.go12
         t.go12line = pcln
 
     fname: Dict[int, str] = {}
+    # Symbol names are highly redundant: make identical names (and paths)
+    # share the same string. File names come from the same cache, and
+    # paths are keyed by their (shared) elements. These caches only live
+    # as long as this call.
+    names: Dict[bytes, str] = {}
+    paths: Dict[Tuple[str, ...], str] = {}
     nf = 0
-    nz = 0
-    lasttyp = 0
-
-    for s in walksymtab(symtab):
-        ts = Sym()
-        t.syms.append(ts)
-        ts.type = s.typ
-        ts.value = s.value
-        ts.go_type = s.gotype
-        if s.typ in b"Zz":
-            if lasttyp not in b"Zz":
-                nz += 1
-            for i in range(0, len(s.name), 2):
-                elt_idx = int.from_bytes(s.name[i:i + 2], "big")
-                elt = fname.get(elt_idx, None)
-                if elt is None:
-                    raise DecodingError("bad filename code")
-                if ts.name and ts.name[-1] != "/":
-                    ts.name += "/"
-                ts.name += elt
-        else:
-            ts.name = s.name.decode(SYMS_ENCODING).replace("·", ".")
-
-        if s.typ in b"f":
-            fname[s.value] = ts.name
-        elif s.typ in b"TtLl":
-            nf += 1
-        lasttyp = s.typ
 
+    obj: Optional[Obj] = None
     if t.go12line is not None:
         obj = Obj()
         t.objs = [obj]
         go12.go12_map_files(t.files, obj)
-    else:
-        t.objs = [Obj() for _ in range(nz)]
 
+    # Symbols are grouped as they are decoded: each run of path symbols
+    # starts a new object, and each text symbol starts a new function,
+    # which owns the symbols up to the next text or path symbol.
+    fn: Optional[Func] = None
+    obj_paths: List[Sym] = []
     lastf = 0
-    i = 0
-    while i < len(t.syms):
-        sym = t.syms[i]
+    lasttyp = 0
+
+    new_sym = Sym
+    add_sym = t.syms.append
+    for typ, value, raw_name, gotype in walksymtab(symtab):
         # path symbol
-        if sym.type in b"Zz":
+        if typ in _PATH_SYMS:
+            elt_idxs = struct.unpack(f">{len(raw_name) // 2}H", raw_name)
+            try:
+                elts = tuple([fname[elt_idx] for elt_idx in elt_idxs])
+            except KeyError:
+                raise DecodingError("bad filename code") from None
+
+            name = paths.get(elts)
+            if name is None:
+                # elements are joined with slashes, unless the path built
+                # so far already ends with one
+                pieces: List[str] = []
+                last = ""  # last character of the path built so far
+                for elt in elts:
+                    if last and last != "/":
+                        pieces.append("/")
+                        last = "/"
+                    if elt:
+                        pieces.append(elt)
+                        last = elt[-1]
+                name = "".join(pieces)
+                paths[elts] = name
+            sym = new_sym(value=value, type=typ, name=name, go_type=gotype)
+            add_sym(sym)
+
+            fn = None
             # Go 1.2 binaries have the file information elsewhere. Ignore.
             if t.go12line is None:
-                i += 1
-                continue
-
-            # Finish the current object
-            if obj is not None:
-                obj.funcs = t.funcs[lastf:]
-            lastf = len(t.funcs)
-
-            # Start new object
-            obj = Obj()
-            t.objs.append(obj)
-
-            # Count & copy path symbols
-            for end in range(i + 1, len(t.syms)):
-                c = t.syms[end].type
-                if c not in b"Zz":
-                    break
-            obj.paths = t.syms[i:end]
-            i = end
+                if lasttyp not in _PATH_SYMS:
+                    # Finish the current object
+                    if obj is not None:
+                        obj.funcs = t.funcs[lastf:]
+                    lastf = len(t.funcs)
+
+                    # Start new object
+                    obj_paths = []
+                    obj = Obj(paths=obj_paths)
+                    t.objs.append(obj)
+                obj_paths.append(sym)
+            lasttyp = typ
             continue
-        elif sym.type in b"TtLl":
+
+        name = names.get(raw_name)
+        if name is None:
+            name = raw_name.decode(SYMS_ENCODING).replace("·", ".")
+            names[raw_name] = name
+        sym = new_sym(value=value, type=typ, name=name, go_type=gotype)
+        add_sym(sym)
+
+        if typ in _TEXT_SYMS:
+            nf += 1
             if t.funcs:
-                t.funcs[-1].end = sym.value
-            if sym.name in {"runtime.etext", "etext"}:
-                i += 1
-                continue
-
-            np = 0
-            na = 0
-            end = 0
-            for end in range(i + 1, len(t.syms)):
-                cur_sym_type = t.syms[end].type
-                if cur_sym_type in b"TtLlZz":
-                    break
-                elif cur_sym_type in b"p":
-                    np += 1
-                elif cur_sym_type in b"a":
-                    na += 1
-
-            # Fill in the function symbol
-            fn = Func()
-            t.funcs.append(fn)
-            sym.func = fn
-            fn.sym = sym
-            fn.entry = sym.value
-            fn.obj = obj
-            if t.go12line is not None:
-                # All functions share the same line table.
-                fn.line_table = t.go12line
-            elif pcln is not None:
-                fn.line_table = pcln.slice(fn.entry)
-                pcln = fn.line_table
-
-            for j in range(i, end):
-                ls = t.syms[j]
-                if ls.type in b"m":
-                    fn.frame_size = s.value
-                elif ls.type in b"p":
-                    fn.params.append(ls)
-                elif ls.type in b"a":
-                    fn.locals.append(ls)
-            i = end
-            continue
-        else:
-            i += 1
+                t.funcs[-1].end = value
+            if name in {"runtime.etext", "etext"}:
+                fn = None
+            else:
+                # Fill in the function symbol
+                fn = Func()
+                t.funcs.append(fn)
+                sym.func = fn
+                fn.sym = sym
+                fn.entry = value
+                fn.obj = obj
+                if t.go12line is not None:
+                    # All functions share the same line table.
+                    fn.line_table = t.go12line
+        elif typ == _FILE_NAME_SYM:
+            fname[value] = name
+        elif fn is not None:
+            if typ == _FRAME_SIZE_SYM:
+                fn.frame_size = value
+            elif typ == _PARAM_SYM:
+                fn.params.append(sym)
+            elif typ == _LOCAL_SYM:
+                fn.locals.append(sym)
+        lasttyp = typ
+
+    if t.go12line is None:
+        # Slice the line table at each function entry, in a single pass.
+        line_tables = pcln.slices([fn.entry for fn in t.funcs])
+        for fn, line_table in zip(t.funcs, line_tables):
+            fn.line_table = line_table
 
     if t.go12line is not None and nf == 0:
         logger.info("reading go12 symbols")